@@ -1,4 +1 @@
-import sys
-import pkg_resources
-
 __version__ = '0.3.0'
@@ -1,12 +1,13 @@
 from abc import abstractmethod
 from abc import ABCMeta
 
-from six import with_metaclass
-
 import numpy as np
 
-# class IBmi(object, metaclass=ABCMeta) can be written
-class IBmi(with_metaclass(ABCMeta, object)):
+
+class IBmi(metaclass=ABCMeta):
+    # no instance dict from the interface, implementations that declare
+    # __slots__ list _var_meta_cache in them
+    __slots__ = ()
 
     @abstractmethod
     def __init__(self, engine, configfile=None, *args, **kwargs):
@@ -28,6 +29,8 @@ class IBmi(with_metaclass(ABCMeta, object)):
         Normally a path to an ``*.ini`` model file is passed to the
         :meth:`__init__`. If so, that model is loaded. Note that
         :meth:`_load_model` changes the working directory to that of the model.
+        Implementations call invalidate_var_meta, a new model can have
+        other variables.
         """
         pass
 
@@ -38,6 +41,7 @@ class IBmi(with_metaclass(ABCMeta, object)):
         Note that the Fortran library's cleanup code is not up to snuff yet,
         so the cleanup is not perfect. Note also that the working directory is
         changed back to the original one.
+        Implementations call invalidate_var_meta.
         """
         pass
 
@@ -62,23 +66,53 @@ class IBmi(with_metaclass(ABCMeta, object)):
         """
         pass
 
+    def _var_meta(self, name):
+        """
+        Return (type, rank, shape) of variable name.
+        The metadata is derived from a single get_var call and cached,
+        variables are expected to keep their type and shape during a run.
+        Call invalidate_var_meta if they do change.
+        """
+        try:
+            cache = self._var_meta_cache
+        except AttributeError:
+            cache = self._var_meta_cache = {}
+        try:
+            return cache[name]
+        except KeyError:
+            var = self.get_var(name)
+            meta = (var.dtype, var.ndim, var.shape)
+            cache[name] = meta
+            return meta
+
+    def invalidate_var_meta(self, name=None):
+        """
+        Forget the cached metadata of variable name, or of all
+        variables if no name is given.
+        """
+        cache = getattr(self, '_var_meta_cache', {})
+        if name is None:
+            cache.clear()
+        else:
+            cache.pop(name, None)
+
     def get_var_type(self, name):
         """
         Return type string, compatible with numpy.
         """
-        return self.get_var(name).dtype
+        return self._var_meta(name)[0]
 
     def get_var_rank(self, name):
         """
         Return array rank or 0 for scalar.
         """
-        return len(self.get_var(name).shape)
+        return self._var_meta(name)[1]
 
     def get_var_shape(self, name):
         """
         Return shape of the array.
         """
-        return self.get_var(name).shape
+        return self._var_meta(name)[2]
 
     @abstractmethod
     def get_start_time(self):
@@ -108,6 +142,15 @@ class IBmi(with_metaclass(ABCMeta, object)):
         """
         pass
 
+    def get_vars(self, names):
+        """
+        Return the nd arrays of all variables in names, in order.
+        The default implementation calls get_var for every name, models
+        that can fetch several variables at once may override this method.
+        """
+        get_var = self.get_var
+        return [get_var(name) for name in names]
+
     @abstractmethod
     def set_var(self, name, var):
         """Set the variable name with the values of var"""
@@ -119,17 +162,21 @@ class IBmi(with_metaclass(ABCMeta, object)):
         from var, in the range (start:start+count).
         Start, count can be integers for rank 1, and can be
         tuples of integers for higher ranks.
-        For some implementations it can be equivalent and more efficient to do:
+        The default implementation writes into the array returned by
+        get_var, which is equivalent to:
         `get_var(name)[start[0]:start[0]+count[0], ..., start[n]:start[n]+count[n]] = var`
+        If that array owns its data, it may be a copy, and it is passed
+        to set_var as well.
         """
-        tmp = self.get_var(name).copy()
         # sometimes we want to slice in 1 dimension, sometimes in more
         # always slice in arrays
         start = np.atleast_1d(start)
         count = np.atleast_1d(count)
-        slices = [np.s_[i:(i+n)] for i,n in zip(start, count)]
-        tmp[slices] = var
-        self.set_var(name, tmp)
+        # plain ints keep numpy on the basic indexing path
+        slices = tuple(np.s_[int(i):int(i)+int(n)] for i,n in zip(start, count))
+        arr = self.get_var(name)
+        arr[slices] = var
+        self._set_var_copy(name, arr)
 
     def set_var_index(self, name, index, var):
         """
@@ -137,13 +184,25 @@ class IBmi(with_metaclass(ABCMeta, object)):
         from var, at the flattened (C-contiguous style)
         indices. Indices is a vector of 0-based
         integers, of the same length as the vector var.
-        For some implementations it can be equivalent
-        and more efficient to do:
+        The default implementation writes into the array returned by
+        get_var, which is equivalent to:
         `get_var(name).flat[index] = var`
+        If that array owns its data, it may be a copy, and it is passed
+        to set_var as well.
+        """
+        arr = self.get_var(name)
+        arr.flat[index] = var
+        self._set_var_copy(name, arr)
+
+    def _set_var_copy(self, name, arr):
+        """
+        Pass arr, as changed by set_var_slice or set_var_index, to set_var
+        if it is not a view on the memory of the model.
         """
-        tmp = self.get_var(name).copy()
-        tmp.flat[index] = var
-        self.set_var(name, tmp)
+        if arr.flags.owndata:
+            # a copy, or the array of a python model, set_var is needed
+            # for the first and harmless for the second
+            self.set_var(name, arr)
 
     @abstractmethod
     def inq_compound(self, name):
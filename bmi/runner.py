@@ -15,50 +15,91 @@ Options:
     --disable-logger  do not inject logger into the BMI library
     --info            display information about the model
 """
+import importlib.util
 import logging
 import os
 import signal
+import sys
+import threading
 
 import docopt
 
-from .wrapper import BMIWrapper
 from . import __version__
 
 
-
 # do colorlogs here
 def colorlogs(format="short"):
     """Append a rainbow logging handler and a formatter to the root logger"""
-    try:
-        from rainbow_logging_handler import RainbowLoggingHandler
-        import sys
-        # setup `RainbowLoggingHandler`
-        logger = logging.root
-        # same as default
-        if format == "short":
-            fmt = "%(message)s "
-        else:
-            fmt = "[%(asctime)s] %(name)s %(funcName)s():%(lineno)d\t%(message)s [%(levelname)s]"
-        formatter = logging.Formatter(fmt)
-        handler = RainbowLoggingHandler(sys.stderr,
-                                        color_funcName=('black', 'gray', True))
-        handler.setFormatter(formatter)
-        logger.addHandler(handler)
-    except ImportError:
+    if importlib.util.find_spec('rainbow_logging_handler') is None:
         # rainbow logger not found, that's ok
-        pass
-
-def get_size(start_path = '.'):
+        return
+    from rainbow_logging_handler import RainbowLoggingHandler
+    # setup `RainbowLoggingHandler`
+    logger = logging.root
+    # calling it again does not add another handler
+    if any(isinstance(handler, RainbowLoggingHandler)
+           for handler in logger.handlers):
+        return
+    # same as default
+    if format == "short":
+        fmt = "%(message)s "
+    else:
+        fmt = "[%(asctime)s] %(name)s %(funcName)s():%(lineno)d\t%(message)s [%(levelname)s]"
+    formatter = logging.Formatter(fmt)
+    handler = RainbowLoggingHandler(sys.stderr,
+                                    color_funcName=('black', 'gray', True))
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+
+def get_size(start_path='.'):
+    """Return the total size in bytes of the files below start_path"""
     total_size = 0
-    for dirpath, dirnames, filenames in os.walk(start_path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            total_size += os.path.getsize(fp)
+    # like os.walk, skip what can not be read or disappears while scanning
+    try:
+        it = os.scandir(start_path)
+    except OSError:
+        return total_size
+    with it:
+        # scandir entries carry the file type, so only files need a stat
+        for entry in it:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    total_size += get_size(entry.path)
+                else:
+                    total_size += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
     return total_size
 
-def trace(model):
-    dirname = os.path.dirname(os.path.abspath(model.configfile))
-    usage = get_size(dirname)
+
+def get_size_in_background(start_path='.'):
+    """Start get_size(start_path) in a daemon thread.
+
+    Return a function that waits for the size and returns it. The daemon
+    thread does not keep the process alive if the model fails.
+    """
+    sizes = []
+    thread = threading.Thread(target=lambda: sizes.append(get_size(start_path)),
+                              daemon=True)
+    thread.start()
+
+    def result():
+        thread.join()
+        if not sizes:
+            # the scan failed, repeat it here to get the error
+            return get_size(start_path)
+        return sizes[0]
+    return result
+
+
+def trace(model, usage=None):
+    """Return disk usage of the model directory and memory usage.
+
+    Pass usage if the size of the model directory is already known.
+    """
+    if usage is None:
+        dirname = os.path.dirname(os.path.abspath(model.configfile))
+        usage = get_size(dirname)
     info = dict(usage=usage)
 
     try:
@@ -70,39 +111,50 @@ def trace(model):
     except ImportError:
         # psutil not found, that's ok
         pass
-    
-    try:
-        import pandas
-        return pandas.Series(info)
-    except ImportError:
-        # pandas not found, that's ok
-        return info
+
+    # only use pandas if it is already loaded, importing it is slow
+    if 'pandas' in sys.modules:
+        return sys.modules['pandas'].Series(info)
+    return info
+
+
+def format_trace(info):
+    """Return trace information as one key: value line per item"""
+    return "\n".join("{}: {}".format(key, value) for key, value in info.items())
 
 
 def main():
     """main bmi runner program"""
     arguments = docopt.docopt(__doc__, version=__version__)
+    # import here, so --help and --version do not load numpy and ctypes
+    from .wrapper import BMIWrapper
     colorlogs()
     # Read input file file
-
-
     wrapper = BMIWrapper(
         engine=arguments['<engine>'],
         configfile=arguments['<config>'] or ''
     )
 
-
     # add logger if required
     if not arguments['--disable-logger']:
         logging.root.setLevel(logging.DEBUG)
         wrapper.set_logger(logging.root)
 
+    # only trace if the information is actually logged
+    show_info = (arguments['--info'] and
+                 logging.root.isEnabledFor(logging.INFO))
+    if show_info:
+        # scan the model directory while the model initializes
+        dirname = os.path.dirname(os.path.abspath(wrapper.configfile))
+        usage = get_size_in_background(dirname)
+
     with wrapper as model:
+        t_start = model.get_start_time()
+        t_end = model.get_end_time()
+
         # if siginfo is supported by OS (BSD)
         def handler(signum, frame):
             """report progress information"""
-            t_start = model.get_start_time()
-            t_end = model.get_end_time()
             t_current = model.get_current_time()
             total = (t_end - t_start)
             now = (t_current - t_start)
@@ -114,16 +166,14 @@ def main():
         if hasattr(signal, 'SIGINFO'):
             # attach a siginfo handler (CTRL-t) to print progress
             signal.signal(signal.SIGINFO, handler)
-
-        if arguments['--info']:
-            logging.info("%s", trace(model))
-        t_end = model.get_end_time()
-        t = model.get_start_time()
-        while t < t_end:
-            model.update(-1)
-            t = model.get_current_time()
-        if arguments['--info']:
-            logging.info("%s", trace(model))
+            # restart interrupted system calls instead of failing
+            signal.siginterrupt(signal.SIGINFO, False)
+
+        if show_info:
+            logging.info("%s", format_trace(trace(model, usage())))
+        model.run_until(t_end)
+        if show_info:
+            logging.info("%s", format_trace(trace(model, get_size(dirname))))
 
 if __name__ == '__main__':
     main()
@@ -3,15 +3,14 @@ This module provides a ctypes wrapper around a bmi library.
 
 """
 
-from __future__ import print_function
 import functools
 import io
 import logging
 import os
 import platform
 import sys
+import threading
 
-import six
 from numpy.ctypeslib import ndpointer  # nd arrays
 import numpy as np
 
@@ -24,9 +23,9 @@ from ctypes import (
     ARRAY, Structure,
     # Making strings
     # Pointering
-    POINTER, byref, CFUNCTYPE,
+    POINTER, byref, addressof, sizeof, CFUNCTYPE,
     # Loading
-    cdll
+    cdll, CDLL
 )
 
 
@@ -42,18 +41,16 @@ def create_string_buffer(init, size=None, encoding=sys.getdefaultencoding()):
     create_string_buffer(anInteger) -> character array
     create_string_buffer(aString, anInteger) -> character array
     """
-    if isinstance(init, six.string_types + (six.binary_type,)):
+    if isinstance(init, str):
+        init = init.encode(encoding)
+    if isinstance(init, bytes):
         if size is None:
             size = len(init) + 1
         buftype = c_char * size
         buf = buftype()
-        try:
-            buf.value = init.encode(encoding)
-        except AttributeError:
-            buf.value = init
-
+        buf.value = init
         return buf
-    elif isinstance(init, six.integer_types):
+    elif isinstance(init, int):
         buftype = c_char * init
         buf = buftype()
         return buf
@@ -70,17 +67,20 @@ LEVELS_PY2F = {
     logging.FATAL: 5
 }
 
-LEVELS_F2PY = dict(zip(LEVELS_PY2F.values(), LEVELS_PY2F.keys()))
-LEVELS_F2PY[6] = logging.FATAL
-# level OFF
+# Indexed by the fortran level, the last one is level OFF
+LEVELS_F2PY = tuple(sorted(LEVELS_PY2F, key=LEVELS_PY2F.get)) + (logging.FATAL, )
 
 
 # We need this defined global, otherwise we get a segfault
 def c_log(level, message):
     """python logger to be called from fortran"""
-    c_level = level
-    level = LEVELS_F2PY[c_level]
-    logger.log(level, message)
+    if 0 <= level < len(LEVELS_F2PY):
+        level = LEVELS_F2PY[level]
+    else:
+        level = logging.FATAL
+    # called for every message, skip the ones nobody listens to
+    if logger.isEnabledFor(level):
+        logger.log(level, message)
 
 # define the type of the fortran function
 fortran_log_functype = CFUNCTYPE(None, c_int, c_char_p)
@@ -110,77 +110,160 @@ TYPEMAP = {
 }
 
 
-def struct2dict(struct):
-    """convert a ctypes structure to a dictionary"""
-    return {x: getattr(struct, x) for x in dict(struct._fields_).keys()}
-
-
-def structs2records(structs):
-    """convert one or more structs and generate dictionaries"""
-    try:
-        n = len(structs)
-    except TypeError:
-        # no array
-        yield struct2dict(structs)
-        # just 1
-        return
-    for i in range(n):
-        struct = structs[i]
-        yield struct2dict(struct)
-
-
-def structs2pandas(structs):
-    """convert ctypes structure or structure array to pandas data frame"""
+def struct2dtype(structtype):
+    """convert a ctypes structure type to a numpy structured dtype"""
+    names = []
+    formats = []
+    offsets = []
+    for name, fieldctype in structtype._fields_:
+        if getattr(fieldctype, '_type_', None) is c_char:
+            # character arrays are strings, not arrays of characters
+            fieldformat = 'S{}'.format(fieldctype._length_)
+        else:
+            fieldformat = np.dtype(fieldctype)
+        names.append(name)
+        formats.append(fieldformat)
+        offsets.append(getattr(structtype, name).offset)
+    return np.dtype({
+        'names': names,
+        'formats': formats,
+        'offsets': offsets,
+        'itemsize': sizeof(structtype)
+    })
+
+
+def structs2pandas(structs, dtype=None):
+    """convert ctypes structure or structure array to pandas data frame
+
+    Pass the dtype of the structure if it is already known.
+    """
     try:
         import pandas
-        records = list(structs2records(structs))
-        df = pandas.DataFrame.from_records(records)
-        # TODO: do this for string columns, for now just for id
-        # How can we check for string columns, this is not nice:
-        # df.columns[df.dtypes == object]
-        if 'id' in df:
-            df["id"] = df["id"].apply(str.rstrip)
-        return df
     except ImportError:
-        # pandas not found, that's ok        
+        # pandas not found, that's ok
         return structs
+    if dtype is None:
+        structtype = getattr(structs, '_type_', type(structs))
+        dtype = struct2dtype(structtype)
+    # view the memory of the structures as a numpy record array
+    records = np.frombuffer(structs, dtype=dtype)
+    columns = {}
+    for name in records.dtype.names:
+        column = records[name]
+        if column.ndim > 1:
+            # array fields become a column with an array per structure
+            column = list(column)
+        columns[name] = column
+    df = pandas.DataFrame(columns, columns=list(records.dtype.names))
+    # TODO: do this for string columns, for now just for id
+    if 'id' in df:
+        df["id"] = np.char.rstrip(records["id"])
+    return df
+
+
+def converter(argtype):
+    """Return a function that converts a python value to argtype."""
+    if argtype == c_char_p:
+        # create a string buffer for strings
+        return create_string_buffer
+    if hasattr(argtype, 'contents'):
+        # type is a pointer, pass the value by reference
+        valuetype = argtype._type_
+        return lambda arg: byref(valuetype(arg))
+    # for other types, use the type to do the conversion
+    return argtype
 
 
 def wrap(func):
     """Return wrapped function with type conversion and sanity checks.
     """
-    @functools.wraps(func, assigned=('restype', 'argtypes'))
+    # look up the conversions once, not on every call
+    converters = [converter(argtype) for argtype in func.argtypes]
+    nargs = len(converters)
+
     def wrapped(*args):
-        if len(args) != len(func.argtypes):
-            logger.warn("{} {} not of same length",
-                        args, func.argtypes)
-
-        typed_args = []
-        for (arg, argtype) in zip(args, func.argtypes):
-            if argtype == c_char_p:
-                # create a string buffer for strings
-                typed_arg = create_string_buffer(arg)
-            else:
-                # for other types, use the type to do the conversion
-                if hasattr(argtype, 'contents'):
-                    # type is a pointer
-                    typed_arg = argtype(argtype._type_(arg))
-                else:
-                    typed_arg = argtype(arg)
-            typed_args.append(typed_arg)
+        if len(args) != nargs:
+            logger.warning("%s %s not of same length",
+                           args, func.argtypes)
+
+        typed_args = [convert(arg) for convert, arg in zip(converters, args)]
         result = func(*typed_args)
         if hasattr(result, 'contents'):
             return result.contents
         else:
             return result
+    wrapped.restype = func.restype
+    wrapped.argtypes = func.argtypes
+    wrapped.__name__ = func.__name__
     return wrapped
 
 
+@functools.lru_cache(maxsize=1)
+def _system():
+    """Return the name of the operating system, looked up once."""
+    return platform.system()
+
+
+# resolved library paths, by the arguments of the search
+LIBRARY_PATHS = {}
+# loaded libraries, by absolute path. A library is only loaded once per
+# process anyway, so all wrappers of the same library share its state.
+LIBRARIES = {}
+
 SHAPEARRAY = ndpointer(dtype='int32',
                        ndim=1,
                        shape=(MAXDIMS,),
                        flags='F')
 
+# argtypes and restype of the library functions, set once after loading
+FUNCTIONS = {
+    'initialize': ([c_char_p], None),
+    'finalize': ([], c_int),
+    'update': ([c_double], c_int),
+    'get_start_time': ([POINTER(c_double)], None),
+    'get_end_time': ([POINTER(c_double)], None),
+    'get_current_time': ([POINTER(c_double)], None),
+    'get_time_step': ([POINTER(c_double)], None),
+    'set_current_time': ([POINTER(c_double)], None),
+    'get_var_count': ([POINTER(c_int)], None),
+    'get_var_name': ([c_int, c_char_p], None),
+    'get_var_type': ([c_char_p, c_char_p], None),
+    'get_var_rank': ([c_char_p, POINTER(c_int)], None),
+    'get_var_shape': ([c_char_p, SHAPEARRAY], None),
+    'inq_compound': ([c_char_p, POINTER(c_int)], None),
+    'inq_compound_field': ([c_char_p, POINTER(c_int), c_char_p, c_char_p,
+                            POINTER(c_int), SHAPEARRAY], None),
+    'get_var': ([c_char_p, POINTER(c_void_p)], None),
+    'set_var': ([c_char_p, c_void_p], None),
+    'set_var_slice': ([c_char_p, POINTER(c_int), POINTER(c_int), c_void_p],
+                      None),
+    'set_structure_field': ([c_char_p, c_char_p, c_char_p,
+                             POINTER(c_void_p)], None),
+    # extensions
+    'run_until': ([POINTER(c_double), POINTER(c_double)], c_int),
+    'set_logger': ([fortran_log_functype], None),
+}
+
+
+class _Scratch(threading.local):
+    """Arguments passed to the library by reference, one set per thread.
+
+    ctypes releases the GIL during library calls, so threads that share a
+    wrapper can not share these arguments.
+    """
+
+    def __init__(self):
+        self.double = c_double()
+        self.int = c_int()
+        # address of a variable, filled in by get_var
+        self.pointer = c_void_p()
+        self.shape = np.empty((MAXDIMS, ), dtype='int32', order='F')
+        # start and count of set_var_slice
+        self.slice = ((c_int * MAXDIMS)(), (c_int * MAXDIMS)())
+        self.strings = (create_string_buffer(MAXSTRLEN),
+                        create_string_buffer(MAXSTRLEN))
+
+
 if not hasattr(sys, 'frozen'):
     try:
         faulthandler.enable()
@@ -246,16 +329,26 @@ class BMIWrapper(IBmi):
 
         if configfile is not None:
             self.configfile = configfile
-        self.known_paths.append('/opt/{}/lib'.format(self.engine))
+        opt_path = '/opt/{}/lib'.format(self.engine)
+        # known_paths is shared by all instances, add each path only once
+        if opt_path not in self.known_paths:
+            self.known_paths.append(opt_path)
         self.library = self._load_library()
+        self._annotate_functions()
+        # encoded names, the library only reads them, so they can be
+        # shared by all threads
+        self._name_buffers = {}
+        # arguments passed by reference, reused by the calls of a thread
+        self._scratch = _Scratch()
+        self._clear_caches()
 
     def _libname(self):
         """Return platform-specific modelf90 shared library name."""
         prefix = 'lib'
         suffix = '.so'
-        if platform.system() == 'Darwin':
+        if _system() == 'Darwin':
             suffix = '.dylib'
-        if platform.system() == 'Windows':
+        if _system() == 'Windows':
             prefix = ''
             suffix = '.dll'
         return prefix + self.engine + suffix
@@ -279,51 +372,130 @@ class BMIWrapper(IBmi):
 
         pathname = 'LD_LIBRARY_PATH'
         separator = ':'
-        if platform.system() == 'Darwin':
+        if _system() == 'Darwin':
             pathname = 'DYLD_LIBRARY_PATH'
             separator = ':'
-        if platform.system() == 'Windows':
+        if _system() == 'Windows':
             # windows does not separate between dll path's and exe paths
             pathname = 'PATH'
             separator = ';'
 
         lib_path_from_environment = os.environ.get(pathname, '')
+        libname = self._libname()
+        # the search depends on relative paths, so also on the working dir
+        key = (libname, lib_path_from_environment, tuple(self.known_paths),
+               os.getcwd())
+        try:
+            return LIBRARY_PATHS[key]
+        except KeyError:
+            pass
         # Expand the paths with the system path if it exists
         if lib_path_from_environment:
             known_paths = [
                 path for path in lib_path_from_environment.split(separator)] + self.known_paths
         else:
             known_paths = self.known_paths
-        # expand ~
-        known_paths = [os.path.expanduser(path) for path in known_paths]
-
-        possible_libraries = [os.path.join(path, self._libname())
-                              for path in known_paths]
+        # expand ~ and look in every directory only once, in order
+        possible_libraries = []
+        seen = set()
+        for path in known_paths:
+            path = os.path.expanduser(path)
+            if path in seen:
+                continue
+            seen.add(path)
+            possible_libraries.append(os.path.join(path, libname))
         for library in possible_libraries:
             if os.path.exists(library):
                 logger.info("Using model fortran library %s", library)
+                LIBRARY_PATHS[key] = library
                 return library
         msg = "Library not found, looked in %s" % ', '.join(possible_libraries)
         raise RuntimeError(msg)
 
     def _load_library(self):
-        """Return the fortran library, loaded with """
+        """Return the fortran library, loaded with ctypes once per path"""
         path = self._library_path()
-        logger.info("Loading library from path {}".format(path))
+        key = os.path.abspath(path)
+        try:
+            return LIBRARIES[key]
+        except KeyError:
+            pass
+        logger.info("Loading library from path %s", path)
+        library = self._open_library(path)
+        LIBRARIES[key] = library
+        return library
+
+    @staticmethod
+    def _open_library(path):
+        """Return the shared library at path, loaded with ctypes"""
         library_dir = os.path.dirname(path)
-        if platform.system() == 'Windows':
-            import win32api
-            olddir = os.getcwd()
-            os.chdir(library_dir)
-            win32api.SetDllDirectory('.')
-
-        result = cdll.LoadLibrary(path)
-
-        if platform.system() == 'Windows':
+        if _system() != 'Windows':
+            # only resolve the symbols of the library when they are used
+            return CDLL(path, mode=os.RTLD_LAZY | os.RTLD_LOCAL)
+        if hasattr(os, 'add_dll_directory'):
+            # python >= 3.8, dependencies are looked up next to the library
+            with os.add_dll_directory(os.path.abspath(library_dir)):
+                return CDLL(path)
+
+        import win32api
+        olddir = os.getcwd()
+        os.chdir(library_dir)
+        win32api.SetDllDirectory('.')
+        try:
+            return cdll.LoadLibrary(path)
+        finally:
             os.chdir(olddir)
 
-        return result
-
+    def _clear_caches(self):
+        """Forget what is known about the variables of the model."""
+        # type, rank and shape, by variable name
+        self._var_meta_cache = {}
+        # variable names, looked up on first use
+        self._var_names = None
+        # ctypes structures, dtypes and fields, by compound type name
+        self._compound_structs = {}
+        # ctypes types of compound variables, by variable name
+        self._compound_ctypes = {}
+        # ctypes types of the compound fields, by variable and field name
+        self._compound_fields = {}
+        # numpy dtypes of the compound structures, by variable name
+        self._compound_dtypes = {}
+        # (address, array) of the last get_var, by variable name. The
+        # array is None for compound variables.
+        self._var_arrays = {}
+        # what get_var needs to know about a variable, by variable name
+        self._var_plans = {}
+
+    def _cstr(self, name):
+        """Return a (cached) string buffer with name, to pass to the library."""
+        try:
+            return self._name_buffers[name]
+        except KeyError:
+            buf = create_string_buffer(name)
+            self._name_buffers[name] = buf
+            return buf
+
+    def _string_buffers(self):
+        """Return the two scratch output strings of this thread, emptied."""
+        strings = self._scratch.strings
+        for buf in strings:
+            # an untouched buffer should read as an empty string
+            buf[0] = b'\0'
+        return strings
+
+    def _annotate_functions(self):
+        """Set argtypes and restype of the known library functions once.
+
+        Functions that are not implemented by the library are skipped.
+        """
+        for name, (argtypes, restype) in FUNCTIONS.items():
+            try:
+                func = getattr(self.library, name)
+            except AttributeError:
+                logger.debug("Function %s not found in %s", name, self.engine)
+                continue
+            func.argtypes = argtypes
+            func.restype = restype
 
     def initialize(self, configfile=None):
         """Initialize and load the Fortran library (and model, if applicable).
@@ -339,23 +511,23 @@ class BMIWrapper(IBmi):
 
         if configfile is not None:
             self.configfile = configfile
+        # a new model can have other variables
+        self.invalidate_var_meta()
         try:
             self.configfile
         except AttributeError:
             raise ValueError("Specify configfile during construction or during initialize")
         abs_name = os.path.abspath(self.configfile)
-        os.chdir(os.path.dirname(self.configfile) or '.')
-        logmsg = "Loading model {} in directory {}".format(
-            self.configfile,
-            os.path.abspath(os.getcwd())
-        )
-        logger.info(logmsg)
+        # models read their input relative to the config file
+        model_dir = os.path.dirname(self.configfile) or '.'
+        if os.path.abspath(model_dir) != os.getcwd():
+            os.chdir(model_dir)
+        logger.info("Loading model %s in directory %s",
+                    self.configfile, os.getcwd())
         # Fortran init function.
-        self.library.initialize.argtypes = [c_char_p]
-        self.library.initialize.restype = None
         # initialize by abs_name because we already chdirred
         # if configfile is a relative path  we would have a problem
-        ierr = wrap(self.library.initialize)(abs_name)
+        ierr = self.library.initialize(create_string_buffer(abs_name))
         if ierr:
             errormsg = "Loading model {config} failed with exit code {code}"
             raise RuntimeError(errormsg.format(config=self.configfile,
@@ -369,28 +541,63 @@ class BMIWrapper(IBmi):
         changed back to the original one.
 
         """
-        self.library.finalize.argtypes = []
-        self.library.finalize.restype = c_int
-        ierr = wrap(self.library.finalize)()
+        ierr = self.library.finalize()
+        self.invalidate_var_meta()
         # always go back to previous directory
-        logger.info('cd {}'.format(self.original_dir))
-        # This one doesn't work.
-        os.chdir(self.original_dir)
+        if os.getcwd() != self.original_dir:
+            logger.info('cd %s', self.original_dir)
+            os.chdir(self.original_dir)
         if ierr:
             errormsg = "Finalizing model {engine} failed with exit code {code}"
             raise RuntimeError(errormsg.format(engine=self.engine, code=ierr))
 
     def update(self, dt=-1):
         """
-        Return type string, compatible with numpy.
+        Update the model with time step dt, or with the default time step
+        of the model if dt is -1. Returns the exit code of the library.
         """
-        self.library.update.argtypes = [c_double]
-        self.library.update.restype = c_int
         if dt == -1:
             # use default timestep
-            dt = self.get_time_step()
-        result = wrap(self.library.update)(dt)
-        return result
+            time_step = self._scratch.double
+            self.library.get_time_step(byref(time_step))
+            dt = time_step.value
+        # update takes the time step by value, argtypes convert it
+        return self.library.update(dt)
+
+    def run_until(self, end_time, dt=-1):
+        """
+        Update the model until end_time is reached, with time step dt or
+        with the default time step of the model if dt is -1.
+
+        Libraries that implement the optional
+        ``run_until(double *end_time, double *dt)`` run the loop themselves.
+        Otherwise the loop calls the library functions directly, without
+        the per call overhead of the wrapper methods.
+        """
+        try:
+            library_run_until = self.library.run_until
+        except AttributeError:
+            pass
+        else:
+            ierr = library_run_until(byref(c_double(end_time)),
+                                     byref(c_double(dt)))
+            if ierr:
+                errormsg = "Running model {engine} failed with exit code {code}"
+                raise RuntimeError(errormsg.format(engine=self.engine, code=ierr))
+            return
+
+        update = self.library.update
+        get_time_step = self.library.get_time_step
+        get_current_time = self.library.get_current_time
+        current_time = c_double()
+        time_step = c_double(dt)
+        get_current_time(byref(current_time))
+        while current_time.value < end_time:
+            if dt == -1:
+                # use default timestep
+                get_time_step(byref(time_step))
+            update(time_step.value)
+            get_current_time(byref(current_time))
 
     # Variable Information Functions
     # Note that these call subroutines.
@@ -401,8 +608,7 @@ class BMIWrapper(IBmi):
         """
         Return number of variables
         """
-        n = c_int()
-        self.library.get_var_count.argtypes = [POINTER(c_int)]
+        n = self._scratch.int
         self.library.get_var_count(byref(n))
         return n.value
 
@@ -410,19 +616,44 @@ class BMIWrapper(IBmi):
         """
         Return variable name
         """
+        if self._var_names is None:
+            self._var_names = [
+                self._get_var_name(j)
+                for j in range(self.get_var_count())
+            ]
+        return self._var_names[i]
+
+    def _get_var_name(self, i):
+        """
+        Return variable name, as reported by the library
+        """
         i = c_int(i)
-        name = create_string_buffer(MAXSTRLEN)
-        self.library.get_var_name.argtypes = [c_int, c_char_p]
+        name, _ = self._string_buffers()
         self.library.get_var_name(i, name)
         return name.value
 
-    def get_var_type(self, name):
+    def _var_meta(self, name):
+        """
+        Return (type, rank, shape) of variable name, as reported by the
+        library. This is looked up once per variable, the get_var_type,
+        get_var_rank and get_var_shape methods of IBmi read it from here.
+        Call invalidate_var_meta if the variable changes type or shape.
+        """
+        try:
+            return self._var_meta_cache[name]
+        except KeyError:
+            pass
+        rank = self._get_var_rank(name)
+        meta = (self._get_var_type(name), rank, self._get_var_shape(name, rank))
+        self._var_meta_cache[name] = meta
+        return meta
+
+    def _get_var_type(self, name):
         """
         Return type string, compatible with numpy.
         """
-        name = create_string_buffer(name)
-        type_ = create_string_buffer(MAXSTRLEN)
-        self.library.get_var_type.argtypes = [c_char_p, c_char_p]
+        name = self._cstr(name)
+        type_, _ = self._string_buffers()
         self.library.get_var_type(name, type_)
         return type_.value
 
@@ -430,10 +661,8 @@ class BMIWrapper(IBmi):
         """
         Return the number of fields and size (not yet) of a compound type.
         """
-        name = create_string_buffer(name)
-        self.library.inq_compound.argtypes = [c_char_p, POINTER(c_int)]
-        self.library.inq_compound.restype = None
-        nfields = c_int()
+        name = self._cstr(name)
+        nfields = self._scratch.int
         self.library.inq_compound(name, byref(nfields))
         return nfields.value
 
@@ -441,23 +670,11 @@ class BMIWrapper(IBmi):
         """
         Lookup the type,rank and shape of a compound field
         """
-        typename = create_string_buffer(name)
+        typename = self._cstr(name)
         index = c_int(index + 1)
-        fieldname = create_string_buffer(MAXSTRLEN)
-        fieldtype = create_string_buffer(MAXSTRLEN)
-        rank = c_int()
-        arraytype = ndpointer(dtype='int32',
-                              ndim=1,
-                              shape=(MAXDIMS, ),
-                              flags='F')
-        shape = np.empty((MAXDIMS, ), dtype='int32', order='F')
-        self.library.inq_compound_field.argtypes = [c_char_p,
-                                                    POINTER(c_int),
-                                                    c_char_p,
-                                                    c_char_p,
-                                                    POINTER(c_int),
-                                                    arraytype]
-        self.library.inq_compound_field.restype = None
+        fieldname, fieldtype = self._string_buffers()
+        rank = self._scratch.int
+        shape = self._scratch.shape
         self.library.inq_compound_field(typename,
                                         byref(index),
                                         fieldname,
@@ -467,15 +684,19 @@ class BMIWrapper(IBmi):
         return (fieldname.value,
                 fieldtype.value,
                 rank.value,
-                tuple(shape[:rank.value]))
+                tuple(shape[:rank.value].tolist()))
 
-    def make_compound_ctype(self, varname):
+    def _compound_struct(self, compoundname):
         """
-        Create a ctypes type that corresponds to a compound type in memory.
+        Return the ctypes structure of compound type compoundname, with the
+        numpy dtype of the same memory layout and the ctypes types of its
+        fields by name. The structure is created once per compound type.
         """
+        try:
+            return self._compound_structs[compoundname]
+        except KeyError:
+            pass
 
-        # look up the type name
-        compoundname = self.get_var_type(varname)
         nfields = self.inq_compound(compoundname)
         # for all the fields look up the type, rank and shape
         fields = []
@@ -486,12 +707,34 @@ class BMIWrapper(IBmi):
             fieldctype = CTYPESMAP[fieldtype]
             if fieldrank == 1:
                 fieldctype = fieldctype * fieldshape[0]
-            fields.append((fieldname, fieldctype))
+            # ctypes expects str field names
+            fields.append((fieldname.decode(), fieldctype))
         # create a new structure
 
         class COMPOUND(Structure):
             _fields_ = fields
 
+        # the same memory layout, for viewing the data with numpy
+        struct = (COMPOUND, struct2dtype(COMPOUND), dict(fields))
+        self._compound_structs[compoundname] = struct
+        return struct
+
+    def make_compound_ctype(self, varname):
+        """
+        Create a ctypes type that corresponds to a compound type in memory.
+        The type is created once per variable.
+        """
+        try:
+            return self._compound_ctypes[varname]
+        except KeyError:
+            pass
+
+        # variables of the same compound type share the structure
+        compoundname = self.get_var_type(varname)
+        COMPOUND, dtype, fields = self._compound_struct(compoundname)
+        self._compound_dtypes[varname] = dtype
+        self._compound_fields[varname] = fields
+
         # if we have a rank 1 array, create an array
         rank = self.get_var_rank(varname)
         assert rank <= 1, "we can't handle >=2 dimensional compounds yet"
@@ -500,42 +743,36 @@ class BMIWrapper(IBmi):
             valtype = POINTER(ARRAY(COMPOUND, shape[0]))
         else:
             valtype = POINTER(COMPOUND)
+        self._compound_ctypes[varname] = valtype
         # return the custom type
         return valtype
 
-    def get_var_rank(self, name):
+    def _get_var_rank(self, name):
         """
         Return array rank or 0 for scalar.
         """
-        name = create_string_buffer(name)
-        rank = c_int()
-        self.library.get_var_rank.argtypes = [c_char_p, POINTER(c_int)]
-        self.library.get_var_rank.restype = None
+        name = self._cstr(name)
+        rank = self._scratch.int
         self.library.get_var_rank(name, byref(rank))
         return rank.value
 
-    def get_var_shape(self, name):
+    def _get_var_shape(self, name, rank):
         """
-        Return shape of the array.
+        Return shape of the array, for a known rank.
         """
-        rank = self.get_var_rank(name)
-        name = create_string_buffer(name)
-        arraytype = ndpointer(dtype='int32',
-                              ndim=1,
-                              shape=(MAXDIMS, ),
-                              flags='F')
-        shape = np.empty((MAXDIMS, ), dtype='int32', order='F')
-        self.library.get_var_shape.argtypes = [c_char_p, arraytype]
+        if rank == 0:
+            # scalars have no shape to ask for
+            return ()
+        name = self._cstr(name)
+        shape = self._scratch.shape
         self.library.get_var_shape(name, shape)
-        return tuple(shape[:rank])
+        return tuple(shape[:rank].tolist())
 
     def get_start_time(self):
         """
         returns start time
         """
-        start_time = c_double()
-        self.library.get_start_time.argtypes = [POINTER(c_double)]
-        self.library.get_start_time.restype = None
+        start_time = self._scratch.double
         self.library.get_start_time(byref(start_time))
         return start_time.value
 
@@ -543,9 +780,7 @@ class BMIWrapper(IBmi):
         """
         returns end time of simulation
         """
-        end_time = c_double()
-        self.library.get_end_time.argtypes = [POINTER(c_double)]
-        self.library.get_end_time.restype = None
+        end_time = self._scratch.double
         self.library.get_end_time(byref(end_time))
         return end_time.value
 
@@ -553,9 +788,7 @@ class BMIWrapper(IBmi):
         """
         returns current time of simulation
         """
-        current_time = c_double()
-        self.library.get_current_time.argtypes = [POINTER(c_double)]
-        self.library.get_current_time.restype = None
+        current_time = self._scratch.double
         self.library.get_current_time(byref(current_time))
         return current_time.value
 
@@ -563,23 +796,24 @@ class BMIWrapper(IBmi):
         """
         returns current time step of simulation
         """
-        time_step = c_double()
-        self.library.get_time_step.argtypes = [POINTER(c_double)]
-        self.library.get_time_step.restype = None
+        time_step = self._scratch.double
         self.library.get_time_step(byref(time_step))
         return time_step.value
 
-    def get_var(self, name):
-        """Return an nd array from model library"""
-        # How many dimensions.
-        rank = self.get_var_rank(name)
-        # The shape array is fixed size
-        shape = np.empty((MAXDIMS, ), dtype='int32', order='F')
-        shape = self.get_var_shape(name)
-        # there should be nothing here...
-        assert sum(shape[rank:]) == 0
-        # variable type name
-        type_ = self.get_var_type(name)
+    def _get_var_plan(self, name):
+        """
+        Return (is_numpytype, arraytype, shape) of variable name, as
+        needed by get_var. This is looked up once per variable,
+        call invalidate_var_meta if the variable changes type or shape.
+        """
+        try:
+            return self._var_plans[name]
+        except KeyError:
+            pass
+        # variable type name, how many dimensions and the shape
+        type_, rank, shape = self._var_meta(name)
+        # the shape is already cut off at the rank
+        assert len(shape) == rank
 
         is_numpytype = type_ in TYPEMAP
 
@@ -594,21 +828,63 @@ class BMIWrapper(IBmi):
             raise ValueError('type not found for variable {}'.format(name))
         else:
             arraytype = self.make_compound_ctype(name)
-        # Create a pointer to the array type
-        data = arraytype()
-        # The functions get_var_type/_shape/_rank are already wrapped with
-        # python function converter, get_var isn't.
-        c_name = create_string_buffer(name)
-        get_var = self.library.get_var
-        get_var.argtypes = [c_char_p, POINTER(arraytype)]
-        get_var.restype = None
-        # Get the array
-        get_var(c_name, byref(data))
-        if not data:
+        plan = (is_numpytype, arraytype, shape)
+        self._var_plans[name] = plan
+        return plan
+
+    def invalidate_var_meta(self, name=None):
+        """
+        Forget what get_var knows about variable name, or about all
+        variables, and their names, if no name is given.
+        """
+        super(BMIWrapper, self).invalidate_var_meta(name)
+        for cache in (self._var_plans, self._var_arrays,
+                      self._compound_ctypes, self._compound_dtypes,
+                      self._compound_fields):
+            if name is None:
+                cache.clear()
+            else:
+                cache.pop(name, None)
+        if name is None:
+            self._compound_structs.clear()
+            self._var_names = None
+
+    def get_var(self, name, as_pandas=True):
+        """Return an nd array from model library
+
+        Compound variables are returned as a pandas data frame, or as a
+        numpy record array on the memory of the model if as_pandas is false.
+
+        The type, rank and shape are looked up again when the model moves
+        the variable. Call invalidate_var_meta if the model resizes a
+        variable in place.
+        """
+        # the metadata of a variable that was seen before can be outdated
+        known = name in self._var_meta_cache
+        is_numpytype, arraytype, shape = self._get_var_plan(name)
+        # The library fills in the address of the variable, the array
+        # type is only needed when it is not in the cache.
+        address = self._scratch.pointer
+        # a library that does not know the variable leaves it NULL
+        address.value = None
+        self.library.get_var(self._cstr(name), byref(address))
+        if not address:
             logger.info("NULL pointer returned")
             return None
+        address = address.value
+
+        cached_address, cached = self._var_arrays.get(name, (None, None))
+        if cached_address == address:
+            if cached is not None:
+                # the memory did not move, reuse the array of the previous call
+                return cached.view()
+        elif known:
+            # the memory moved, the model may have resized the variable
+            self.invalidate_var_meta(name)
+            is_numpytype, arraytype, shape = self._get_var_plan(name)
 
         if is_numpytype:
+            data = arraytype(address)
             # for now always a pointer, see python-subgrid for advanced examples
             #  For  numpy >= 1.16
             if hasattr(data, 'contents'):
@@ -616,101 +892,76 @@ class BMIWrapper(IBmi):
             # for numpy <= 1.14
             else:
                 array = np.ctypeslib.as_array(data)
-        else:
-            array = structs2pandas(data.contents)
+            self._var_arrays[name] = (address, array)
+            return array
 
-        return array
+        # compounds are not cached, only their address is remembered
+        self._var_arrays[name] = (address, None)
+        # arraytype is a pointer to the compound (array) type
+        structs = arraytype._type_.from_address(address)
+        if as_pandas:
+            return structs2pandas(structs, self._compound_dtypes[name])
+        return np.frombuffer(structs, dtype=self._compound_dtypes[name])
 
     def set_var(self, name, var):
         set_var = self.library.set_var
-        set_var.argtypes = [c_char_p, c_void_p]
-        set_var.restype = None
-        ptr = var.ctypes.data_as(c_void_p)
-        c_name = create_string_buffer(name)
+        # the address as a plain int, ctypes converts it to a void pointer
+        ptr = var.ctypes.data
+        c_name = self._cstr(name)
         set_var(c_name, ptr)
 
     def set_var_slice(self, name, start, count, var):
         rank = self.get_var_rank(name)
-        set_var_slice = self.library.set_var_slice
-        set_var_slice.argtypes = [c_char_p, c_int*rank, c_int*rank, c_void_p]
-        set_var_slice.restype = None
-        ptr = var.ctypes.data_as(c_void_p)
-        c_name = create_string_buffer(name)
-        c_start = (c_int*rank)(*start)
-        c_count = (c_int*rank)(*count)
-        set_var_slice(c_name, c_start, c_count, ptr)
-
-    def set_var_index(self, name, index, var):
-        super(self).set_var_index(name, index, var)
+        ptr = var.ctypes.data
+        c_name = self._cstr(name)
+        # the library reads the first rank elements of start and count
+        c_start, c_count = self._scratch.slice
+        c_start[:rank] = [int(i) for i in start]
+        c_count[:rank] = [int(n) for n in count]
+        self.library.set_var_slice(c_name, c_start, c_count, ptr)
 
     def set_structure_field(self, name, id, field, value):
-        # This only works for 1d
-        rank = self.get_var_rank(name)
-        assert rank == 1
-        # The shape array is fixed size
-        shape = np.empty((MAXDIMS, ), dtype='int32', order='F')
-        shape = self.get_var_shape(name)
-        # there should be nothing here...
-        assert sum(shape[rank:]) == 0
-
-        # look up the type name
-        typename = self.get_var_type(name)
-        assert typename not in TYPEMAP
-        nfields = self.inq_compound(typename)
-        # for all the fields look up the type, rank and shape
-        fields = {}
-        for i in range(nfields):
-            (fieldname, fieldtype,
-             fieldrank, fieldshape) = self.inq_compound_field(typename, i)
-            assert fieldrank <= 1
-            fieldctype = CTYPESMAP[fieldtype]
-            if fieldrank == 1:
-                fieldctype = fieldctype * fieldshape[0]
-            fields[fieldname] = fieldctype
-
-        T = fields[field]       # type (c_double)
-        T_p = POINTER(T)        # void pointer, as used in the model
-
-        set_structure_field = self.library.set_structure_field
-        set_structure_field.argtypes = [
-            c_char_p, c_char_p, c_char_p, POINTER(T_p)]
-        set_structure_field.restype = None
-        # So the value is a void pointer by reference....
-        # Create a value wrapped in a c_double_p
-
-        # wrap it up in the first pointer
-        c_value = T_p(T(value))
+        # This only works for 1d compound variables
+        is_numpytype, _, shape = self._get_var_plan(name)
+        assert not is_numpytype
+        assert len(shape) == 1
+        # the field types are known since the compound type was made
+        fields = self._compound_fields[name]
+        if isinstance(field, bytes):
+            T = fields[field.decode()]
+        else:
+            T = fields[field]   # type (c_double)
+        # the model expects a void pointer to the value, by reference
+        c_value = T(value)
+        c_value_p = c_void_p(addressof(c_value))
 
-        c_name = create_string_buffer(name)
-        c_id = create_string_buffer(id)
-        c_field = create_string_buffer(field)
-        # Pass the void_p by reference...
-        set_structure_field(c_name, c_id, c_field, byref(c_value))
+        self.library.set_structure_field(self._cstr(name),
+                                         create_string_buffer(id),
+                                         self._cstr(field),
+                                         byref(c_value_p))
 
     # extensions
     def set_logger(self, logger):
         """subscribe to fortran log messages"""
-
-        # we don't expect anything back
         try:
-            self.library.set_logger.restype = None
+            set_logger = self.library.set_logger
         except AttributeError:
-            logger.warn("Tried to set logger but method is not implemented in %s", self.engine)
+            # the argument shadows the module logger
+            logging.getLogger(__name__).warning(
+                "Tried to set logger but method is not implemented in %s",
+                self.engine
+            )
             return
-        # as an argument we need a pointer to a fortran log func...
-        self.library.set_logger.argtypes = [
-            (fortran_log_functype)]
-
-        self.library.set_logger(fortran_log_func)
+        # pass the module level callback, it has to outlive the library
+        set_logger(fortran_log_func)
 
     def set_current_time(self, current_time):
         """
         sets current time of simulation
         """
-        current_time = c_double(current_time)
+        self._scratch.double.value = current_time
+        current_time = self._scratch.double
         try:
-            self.library.set_current_time.argtypes = [POINTER(c_double)]
-            self.library.set_current_time.restype = None
             self.library.set_current_time(byref(current_time))
         except AttributeError:
             logger.warn("Tried to set current time but method is not implemented in %s", self.engine)
@@ -1,5 +1,4 @@
 from setuptools import setup, find_packages
-import sys
 
 version = '0.3.0'
 
@@ -15,17 +14,12 @@ install_requires = [
     #    'pandas',
     #    'psutil',
     'docopts',
-    'six',
     # 2.2.1 is broken: https://github.com/laysakura/rainbow_logging_handler/issues/7
     #    'rainbow_logging_handler<2.2.1'
 ]
 
-if sys.version_info[0] < 3:
-    install_requires.append('faulthandler')
-
 tests_require = [
-    'nose',
-    'mock',
+    'pytest',
     'coverage'
 ]
 
@@ -41,10 +35,8 @@ setup(
         "License :: OSI Approved :: GNU General Public License v3 or later (GPLv3+)",
         "Topic :: Scientific/Engineering",
         "Topic :: Software Development :: Libraries",
-        'Programming Language :: Python :: 2',
-        'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
-        'Programming Language :: Python :: 3.5'
+        'Programming Language :: Python :: 3.6'
     ],
     keywords=["hydrodynamic", "simulation", "flooding", "BMI"],
     author='Fedor Baart',
@@ -54,6 +46,7 @@ setup(
     packages=find_packages(exclude=["contrib", "docs", "tests*"]),
     include_package_data=True,
     zip_safe=False,
+    python_requires='>=3.6',
     install_requires=install_requires,
     #    setup_requires=[
     #        'sphinx',
@@ -62,7 +55,6 @@ setup(
 
     tests_require=tests_require,
     extras_require={'test': tests_require},
-    test_suite='nose.collector',
     entry_points={'console_scripts': [
         '{0} = bmi.runner:main'.format(
             'bmi-runner')
@@ -1,9 +1,13 @@
 import logging
+import os
 import unittest
 
+import numpy as np
+
 from bmi.api import IBmi
 
-logging.basicConfig(level=logging.DEBUG)
+# set BMI_TEST_LOG=DEBUG to see what the wrapper does
+logging.basicConfig(level=os.environ.get('BMI_TEST_LOG', 'WARNING'))
 logger = logging.getLogger(__name__)
 
 
@@ -23,9 +27,10 @@ class SimpleModel(IBmi):
 
     def initialize(self, configfile=None):
         self.configfile = configfile
+        self.invalidate_var_meta()
 
     def finalize(self):
-        pass
+        self.invalidate_var_meta()
 
     def update(self, dt=-1):
         if dt != -1:
@@ -61,6 +66,25 @@ class SimpleModel(IBmi):
         raise ValueError("I do not have custom types")
 
 
+class ArrayModel(SimpleModel):
+    def __init__(self, *args, **kwargs):
+        super(ArrayModel, self).__init__(*args, **kwargs)
+        self.arrays = {'arr1': np.arange(6.0).reshape(2, 3)}
+        self.get_var_calls = 0
+
+    def get_var(self, var_name):
+        self.get_var_calls += 1
+        return self.arrays[var_name]
+
+    def set_var(self, var_name, value):
+        self.arrays[var_name] = value
+
+
+class CopyModel(ArrayModel):
+    def get_var(self, var_name):
+        return super(CopyModel, self).get_var(var_name).copy()
+
+
 class TestCase(unittest.TestCase):
     engine = "model"
 
@@ -77,3 +101,75 @@ class TestCase(unittest.TestCase):
     def test_engine_engine_set(self):
         self.model = SimpleModel(engine='model')
         self.assertEqual(self.model.engine, 'model')
+
+    def test_slots(self):
+        class Mixin(object):
+            __slots__ = ('extra', )
+
+        # the interface combines with other bases that declare __slots__
+        class SlottedModel(IBmi, Mixin):
+            __slots__ = ('_var_meta_cache', )
+        self.assertEqual(SlottedModel.__dictoffset__, 0)
+
+    def test_var_meta(self):
+        self.model = ArrayModel(engine='model')
+        self.assertEqual(self.model.get_var_type('arr1'), np.dtype('double'))
+        self.assertEqual(self.model.get_var_rank('arr1'), 2)
+        self.assertEqual(self.model.get_var_shape('arr1'), (2, 3))
+        # metadata is looked up once
+        self.assertEqual(self.model.get_var_calls, 1)
+
+    def test_get_vars(self):
+        self.model = ArrayModel(engine='model')
+        self.model.arrays['arr2'] = np.zeros(2)
+        arr2, arr1 = self.model.get_vars(['arr2', 'arr1'])
+        self.assertIs(arr1, self.model.arrays['arr1'])
+        self.assertIs(arr2, self.model.arrays['arr2'])
+
+    def test_invalidate_var_meta(self):
+        self.model = ArrayModel(engine='model')
+        self.assertEqual(self.model.get_var_rank('arr1'), 2)
+        self.model.set_var('arr1', np.zeros(4))
+        self.model.invalidate_var_meta('arr1')
+        self.assertEqual(self.model.get_var_rank('arr1'), 1)
+
+    def test_initialize_invalidates_var_meta(self):
+        self.model = ArrayModel(engine='model')
+        self.assertEqual(self.model.get_var_rank('arr1'), 2)
+        # a new model, with other variables
+        self.model.arrays['arr1'] = np.zeros(4)
+        self.model.initialize()
+        self.assertEqual(self.model.get_var_rank('arr1'), 1)
+
+    def test_set_var_slice(self):
+        self.model = ArrayModel(engine='model')
+        self.model.set_var_slice('arr1', (1, 0), (1, 2), [10.0, 11.0])
+        np.testing.assert_allclose(self.model.arrays['arr1'],
+                                   [[0, 1, 2], [10, 11, 5]])
+
+    def test_set_var_index(self):
+        self.model = ArrayModel(engine='model')
+        self.model.set_var_index('arr1', [0, 5], [10.0, 11.0])
+        np.testing.assert_allclose(self.model.arrays['arr1'],
+                                   [[10, 1, 2], [3, 4, 11]])
+
+    def test_set_var_slice_numpy_start(self):
+        self.model = ArrayModel(engine='model')
+        start = np.array([0, 1], dtype='int32')
+        count = np.array([2, 1], dtype='int32')
+        self.model.set_var_slice('arr1', start, count, [[10.0], [11.0]])
+        np.testing.assert_allclose(self.model.arrays['arr1'],
+                                   [[0, 10, 2], [3, 11, 5]])
+
+    def test_set_var_slice_copy(self):
+        # get_var returns a copy, the result is passed to set_var
+        self.model = CopyModel(engine='model')
+        self.model.set_var_slice('arr1', (1, 0), (1, 2), [10.0, 11.0])
+        np.testing.assert_allclose(self.model.arrays['arr1'],
+                                   [[0, 1, 2], [10, 11, 5]])
+
+    def test_set_var_index_copy(self):
+        self.model = CopyModel(engine='model')
+        self.model.set_var_index('arr1', [0, 5], [10.0, 11.0])
+        np.testing.assert_allclose(self.model.arrays['arr1'],
+                                   [[10, 1, 2], [3, 4, 11]])
@@ -1,40 +1,81 @@
+import ctypes
 import logging
+import os
 import unittest
-import nose
+from unittest import mock
 import numpy.testing as npt
 import numpy as np
-try:
-    import mock
-except ImportError:
-    pass
 
 import bmi.wrapper
-bmi.wrapper.BMIWrapper.known_paths += ['tests']
+# find the test models, also when this module is imported more than once
+if 'tests' not in bmi.wrapper.BMIWrapper.known_paths:
+    bmi.wrapper.BMIWrapper.known_paths.append('tests')
 
-logging.basicConfig(level=logging.DEBUG)
+# set BMI_TEST_LOG=DEBUG to see what the wrapper does
+logging.basicConfig(level=os.environ.get('BMI_TEST_LOG', 'WARNING'))
 logger = logging.getLogger(__name__)
 
-class TestCase(unittest.TestCase):
-    engine = "modelfortran"
-    def setUp(self):
-        self.wrapper = bmi.wrapper.BMIWrapper(engine=self.engine,
-                                              configfile="model.ini")
 
-    @mock.patch('platform.system', lambda: 'Linux')
-    def test_libname1(self):
-        self.assertEqual(self.wrapper._libname(), 'lib%s.so' % (self.engine, ))
+class FakeLibrary(object):
+    """The variable functions of a model library, on double arrays"""
+
+    def __init__(self, arrays):
+        self.arrays = arrays
+        for name in ('get_var_type', 'get_var_rank', 'get_var_shape',
+                     'get_var'):
+            setattr(self, name, mock.Mock(side_effect=getattr(self, '_' + name)))
+
+    def _get_var_type(self, name, type_):
+        type_.value = b'double'
 
-    @mock.patch('platform.system', lambda: 'Darwin')
-    def test_libname2(self):
-        self.assertEqual(self.wrapper._libname(), 'lib%s.dylib' % (self.engine, ))
+    def _get_var_rank(self, name, rank):
+        rank._obj.value = self.arrays[name.value].ndim
+
+    def _get_var_shape(self, name, shape):
+        arr = self.arrays[name.value]
+        shape[:arr.ndim] = arr.shape
+
+    def _get_var(self, name, address):
+        address._obj.value = self.arrays[name.value].ctypes.data
+
+
+class TestCase(unittest.TestCase):
+    engine = "modelfortran"
 
-    @mock.patch('platform.system', lambda: 'Windows')
-    def test_libname3(self):
-        self.assertEqual(self.wrapper._libname(), '%s.dll' % (self.engine, ))
+    @classmethod
+    def setUpClass(cls):
+        # the library is loaded once, the wrapper is shared by the tests
+        cls.wrapper = bmi.wrapper.BMIWrapper(engine=cls.engine,
+                                             configfile="model.ini")
+
+    def test_libname(self):
+        cases = {
+            'Linux': 'lib%s.so',
+            'Darwin': 'lib%s.dylib',
+            'Windows': '%s.dll'
+        }
+        # the operating system is cached, forget the patched ones afterwards
+        self.addCleanup(bmi.wrapper._system.cache_clear)
+        for system, libname in cases.items():
+            with self.subTest(system=system):
+                bmi.wrapper._system.cache_clear()
+                with mock.patch('platform.system', return_value=system):
+                    self.assertEqual(self.wrapper._libname(),
+                                     libname % (self.engine, ))
 
     def test_initialize(self):
         self.wrapper.initialize()
 
+    def test_initialize_empty_configfile(self):
+        # without a directory in the configfile, the model runs here
+        wrapper = bmi.wrapper.BMIWrapper(engine=self.engine, configfile='')
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        with mock.patch.object(wrapper, 'library') as library:
+            library.initialize.return_value = None
+            wrapper.initialize()
+        self.assertEqual(os.getcwd(), cwd)
+
     def test_finalize(self):
         self.wrapper.initialize()
         self.wrapper.finalize()
@@ -47,18 +88,6 @@ class TestCase(unittest.TestCase):
         with self.wrapper as model:
             model.update()
 
-    def test_start_time(self):
-        with self.wrapper as model:
-            self.assertEqual(0, model.get_start_time())
-
-    def test_current_time(self):
-        with self.wrapper as model:
-            self.assertEqual(0, model.get_current_time())
-
-    def test_end_time(self):
-        with self.wrapper as model:
-            self.assertEqual(10, model.get_end_time())
-
     def test_update_time(self):
         with self.wrapper as model:
             self.assertEqual(0, model.get_current_time())
@@ -73,15 +102,16 @@ class TestCase(unittest.TestCase):
             model.update(5)
             self.assertEqual(6, model.get_current_time())
 
-    def test_get_var(self):
-        with self.wrapper as model:
-            arr1 = model.get_var('arr1')
-            npt.assert_allclose(arr1, [3,2,1])
     def test_set_var(self):
         with self.wrapper as model:
+            # variables of the same type and shape share the zeros
+            zeros_cache = {}
             for name in ('arr1', 'arr2', 'arr3'):
                 arr = model.get_var(name)
-                zeros = np.zeros_like(arr)
+                zeros = zeros_cache.get((arr.dtype, arr.shape))
+                if zeros is None:
+                    zeros = np.zeros_like(arr)
+                    zeros_cache[(arr.dtype, arr.shape)] = zeros
                 model.set_var(name, zeros)
                 arr_a = model.get_var(name)
                 npt.assert_allclose(arr_a, zeros)
@@ -95,6 +125,31 @@ class TestCase(unittest.TestCase):
             a[0] = 5
             npt.assert_allclose(a, b)
 
+    def test_get_var_reallocated(self):
+        library = FakeLibrary({b'arr1': np.zeros(3)})
+        with mock.patch.object(bmi.wrapper.BMIWrapper, '_load_library',
+                               return_value=library):
+            wrapper = bmi.wrapper.BMIWrapper(engine=self.engine)
+        self.assertEqual(wrapper.get_var('arr1').shape, (3, ))
+        # the model allocates the variable again, with another size
+        library.arrays[b'arr1'] = np.arange(5.0)
+        arr1 = wrapper.get_var('arr1')
+        self.assertEqual(arr1.shape, (5, ))
+        npt.assert_allclose(arr1, np.arange(5.0))
+        self.assertEqual(wrapper.get_var_shape('arr1'), (5, ))
+
+    def test_get_var_resized_in_place(self):
+        memory = np.arange(5.0)
+        library = FakeLibrary({b'arr1': memory[:3]})
+        with mock.patch.object(bmi.wrapper.BMIWrapper, '_load_library',
+                               return_value=library):
+            wrapper = bmi.wrapper.BMIWrapper(engine=self.engine)
+        self.assertEqual(wrapper.get_var('arr1').shape, (3, ))
+        # the model uses more of the same memory
+        library.arrays[b'arr1'] = memory
+        wrapper.invalidate_var_meta('arr1')
+        npt.assert_allclose(wrapper.get_var('arr1'), memory)
+
     def test_set_logger(self):
         self.wrapper = bmi.wrapper.BMIWrapper(engine="modelc",
                                               configfile="model.ini")
@@ -106,6 +161,34 @@ class TestCase(unittest.TestCase):
             model.update()
 
 
+class TestInitialized(unittest.TestCase):
+    """Tests that only read from the model share one initialized model"""
+    engine = "modelfortran"
+
+    @classmethod
+    def setUpClass(cls):
+        cls.model = bmi.wrapper.BMIWrapper(engine=cls.engine,
+                                           configfile="model.ini")
+        cls.model.initialize()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.model.finalize()
+
+    def test_start_time(self):
+        self.assertEqual(0, self.model.get_start_time())
+
+    def test_current_time(self):
+        self.assertEqual(0, self.model.get_current_time())
+
+    def test_end_time(self):
+        self.assertEqual(10, self.model.get_end_time())
+
+    def test_get_var(self):
+        arr1 = self.model.get_var('arr1')
+        npt.assert_allclose(arr1, [3,2,1])
+
+
 class TestCreateStringBuffer(unittest.TestCase):
     def test_create_string_buffer(self):
         bmi.wrapper.create_string_buffer(4)
@@ -114,6 +197,30 @@ class TestCreateStringBuffer(unittest.TestCase):
         bmi.wrapper.create_string_buffer(u'test')
 
 
-
-if __name__ == '__main__':
-    nose.main()
+class TestStructs(unittest.TestCase):
+    def test_struct2dtype(self):
+        class Pump(ctypes.Structure):
+            _fields_ = [('id', ctypes.c_char * 8),
+                        ('capacity', ctypes.c_double)]
+        pumps = (Pump * 2)()
+        pumps[1].id = b'p2  '
+        pumps[1].capacity = 2.0
+        dtype = bmi.wrapper.struct2dtype(Pump)
+        self.assertEqual(dtype.itemsize, ctypes.sizeof(Pump))
+        records = np.frombuffer(pumps, dtype=dtype)
+        self.assertEqual(records['id'][1], b'p2  ')
+        self.assertEqual(records['capacity'][1], 2.0)
+
+    def test_structs2pandas_array_field(self):
+        class Pump(ctypes.Structure):
+            _fields_ = [('id', ctypes.c_char * 8),
+                        ('levels', ctypes.c_double * 3)]
+        pumps = (Pump * 2)()
+        pumps[1].id = b'p2  '
+        pumps[1].levels[:] = [1.0, 2.0, 3.0]
+        df = bmi.wrapper.structs2pandas(pumps)
+        if not hasattr(df, 'columns'):
+            self.skipTest('pandas is not installed')
+        self.assertEqual(list(df.columns), ['id', 'levels'])
+        self.assertEqual(df['id'][1], b'p2')
+        npt.assert_allclose(df['levels'][1], [1.0, 2.0, 3.0])